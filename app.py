@@ -8,12 +8,16 @@ and ensures the same image is returned for the same ID or query.
 
 import os
 import json
+import hmac
 import hashlib
 import random
 from flask import Flask, jsonify, request, redirect, abort, render_template
 from flask_cors import CORS
 import logging
 
+from phash import SimilarityIndex
+from profiling import RequestProfiler
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,10 +27,13 @@ logger = logging.getLogger(__name__)
 API_VERSION = "1.0.0"
 DATABASE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.json")
 DEFAULT_PORT = 5001
+DEFAULT_SIMILAR_COUNT = 5
+MAX_SIMILAR_COUNT = 50
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes and origins
+profiler = RequestProfiler.from_env(app)  # Opt-in request profiling (see PROFILING_* env vars)
 
 # Load the database
 def load_database():
@@ -54,6 +61,13 @@ def select_image_by_hash(query_hash, database):
 database = load_database()
 logger.info(f"Loaded database with {len(database['images'])} images")
 
+# Build the perceptual-hash similarity index
+images_by_id = {image["id"]: image for image in database["images"]}
+similarity_index = SimilarityIndex.from_images(database["images"])
+logger.info(f"Built similarity index with {len(similarity_index)} hashed images")
+if database["images"] and not len(similarity_index):
+    logger.warning("No images have perceptual hashes; re-run scraper.py to enable similar-image search and deduplication")
+
 @app.route('/')
 def index():
     random_image = random.choice(database["images"]) if database["images"] else None
@@ -97,6 +111,24 @@ def get_image():
         image["query_hash"] = query_hash
         return jsonify(image)
 
+@app.route('/api/image/<image_id>/similar')
+def similar_images(image_id):
+    try:
+        k = int(request.args.get('k', DEFAULT_SIMILAR_COUNT))
+    except ValueError:
+        k = None
+    if k is None or not 1 <= k <= MAX_SIMILAR_COUNT:
+        return jsonify({"error": f"Parameter 'k' must be an integer between 1 and {MAX_SIMILAR_COUNT}"}), 400
+
+    if image_id not in images_by_id:
+        return jsonify({"error": f"Image with ID '{image_id}' not found"}), 404
+    if image_id not in similarity_index:
+        return jsonify({"error": f"Image with ID '{image_id}' has no perceptual hash"}), 404
+
+    similar = [{**images_by_id[similar_id], "distance": distance}
+               for similar_id, distance in similarity_index.similar_to(image_id, k)]
+    return jsonify({"id": image_id, "similar": similar})
+
 @app.route('/api/films')
 def list_films():
     return jsonify({"film_codes": database["film_codes"]})
@@ -134,6 +166,31 @@ def redirect_image():
             abort(404)
         return redirect(image["url"])
 
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    token = os.environ.get("PROFILING_TOKEN")
+    if not token:
+        abort(404)
+    supplied = request.headers.get("X-Profiling-Token", "")
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return jsonify({"error": "Invalid profiling token"}), 403
+
+    if request.method == 'POST':
+        settings = request.get_json(silent=True) if request.get_data() else {}
+        if not isinstance(settings, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        if not isinstance(settings.get("dump", False), bool):
+            return jsonify({"error": "dump must be a boolean"}), 400
+        try:
+            profiler.configure(enabled=settings.get("enabled"),
+                               sample_rate=settings.get("sample_rate"),
+                               slow_ms=settings.get("slow_ms"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if settings.get("dump"):
+            profiler.dump()
+    return jsonify(profiler.status())
+
 if __name__ == "__main__":
     database = load_database()
     logger.info(f"Starting Ghibli Landscapes API with {len(database['images'])} images")
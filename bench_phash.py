@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Ghibli Landscapes API - Similarity Index Benchmark
+
+This script measures build and query latency of the perceptual-hash
+similarity index on a synthetic catalog.
+"""
+
+import sys
+import time
+import random
+
+from phash import SimilarityIndex, find_duplicates
+
+# Constants
+DEFAULT_CATALOG_SIZE = 100_000
+QUERY_COUNT = 200
+SIMILAR_COUNT = 10
+FILM_COUNT = 27
+
+
+def make_catalog(size):
+    """Generate synthetic image records with random 64-bit hashes."""
+    rng = random.Random(42)
+    return [
+        {
+            "id": f"{i:016x}",
+            "film_code": f"film{i % FILM_COUNT}",
+            "phash": f"{rng.getrandbits(64):016x}",
+        }
+        for i in range(size)
+    ]
+
+
+def timed(func, *args):
+    """Run a function and return its result with the elapsed milliseconds."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    """Run the benchmark."""
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CATALOG_SIZE
+    images = make_catalog(size)
+    print(f"Catalog size: {size} images")
+
+    index, build_ms = timed(SimilarityIndex.from_images, images)
+    print(f"Index build: {build_ms:.1f} ms")
+
+    latencies = []
+    for image in random.Random(7).sample(images, min(QUERY_COUNT, size)):
+        _, query_ms = timed(index.similar_to, image["id"], SIMILAR_COUNT)
+        latencies.append(query_ms)
+    latencies.sort()
+    print(f"Query k={SIMILAR_COUNT} over {len(latencies)} queries: "
+          f"p50 {latencies[len(latencies) // 2]:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms")
+
+    duplicates, dedup_ms = timed(find_duplicates, images)
+    print(f"Deduplication: {dedup_ms:.1f} ms ({len(duplicates)} near-duplicates)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Ghibli Landscapes API - Perceptual Hashing
+
+This module computes perceptual hashes (dHash) for locally stored images and
+provides a similarity index used to find near-duplicate frames.
+"""
+
+import numpy as np
+
+# Constants
+HASH_SIZE = 8                  # 8x8 grid -> 64-bit hash
+DUPLICATE_THRESHOLD = 6        # Max Hamming distance treated as a near-duplicate
+
+# Per-byte popcount table, used when NumPy has no native bitwise_count
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# -----------------------------------------------------------------------------
+# Hashing
+# -----------------------------------------------------------------------------
+def compute_dhash(image_path, hash_size=HASH_SIZE):
+    """Compute the difference hash of an image file as a hex string."""
+    # Pillow is only needed when building the catalog, not when serving it
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        gray = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = np.asarray(gray, dtype=np.int16)
+
+    # Each bit records whether brightness increases left-to-right
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    """Return the number of differing bits between two hex hashes."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def _popcount(values):
+    """Count set bits in each element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    counts = _POPCOUNT_TABLE[values.view(np.uint8)]
+    return counts.reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+# -----------------------------------------------------------------------------
+# Similarity index
+# -----------------------------------------------------------------------------
+class SimilarityIndex:
+    """
+    Vectorized Hamming-distance index over 64-bit perceptual hashes.
+
+    Hashes are packed into a contiguous uint64 array so a query is a single
+    XOR + popcount pass over the catalog, which stays in the low milliseconds
+    even with 100k+ images.
+    """
+
+    def __init__(self, ids, hashes):
+        self.ids = list(ids)
+        self.hashes = np.array([int(h, 16) for h in hashes], dtype=np.uint64)
+        self._positions = {image_id: i for i, image_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_images(cls, images):
+        """Build an index from database image records that have a 'phash'."""
+        hashed = [img for img in images if img.get("phash")]
+        return cls((img["id"] for img in hashed), (img["phash"] for img in hashed))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, image_id):
+        return image_id in self._positions
+
+    def distances(self, phash):
+        """Return the Hamming distance from a hex hash to every indexed hash."""
+        return _popcount(self.hashes ^ np.uint64(int(phash, 16)))
+
+    def query(self, phash, k=5, exclude_id=None):
+        """Return up to k (image_id, distance) pairs closest to a hex hash."""
+        if not self.ids or k <= 0:
+            return []
+        distances = self.distances(phash)
+        if exclude_id in self._positions:
+            # Push the query image itself past every real candidate
+            distances = distances.astype(np.int16)
+            distances[self._positions[exclude_id]] = np.iinfo(np.int16).max
+
+        k = min(k, len(self.ids) - (exclude_id in self._positions))
+        if k <= 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.lexsort((nearest, distances[nearest]))]
+        return [(self.ids[i], int(distances[i])) for i in nearest]
+
+    def similar_to(self, image_id, k=5):
+        """Return up to k (image_id, distance) pairs closest to an indexed image."""
+        position = self._positions.get(image_id)
+        if position is None:
+            return []
+        return self.query(f"{int(self.hashes[position]):016x}", k, exclude_id=image_id)
+
+
+def find_duplicates(images, threshold=DUPLICATE_THRESHOLD):
+    """
+    Return the IDs of images that are near-duplicates of an earlier image.
+
+    Images are compared within the same film only, and the first occurrence
+    of each cluster of near-identical frames is kept.
+    """
+    duplicates = set()
+    by_film = {}
+    for img in images:
+        if img.get("phash"):
+            by_film.setdefault(img["film_code"], []).append(img)
+
+    for film_images in by_film.values():
+        index = SimilarityIndex.from_images(film_images)
+        kept = np.ones(len(index), dtype=bool)
+        for i in range(len(index)):
+            if not kept[i]:
+                continue
+            close = index.distances(film_images[i]["phash"]) <= threshold
+            close[: i + 1] = False
+            kept &= ~close
+        duplicates.update(index.ids[i] for i in np.flatnonzero(~kept))
+    return duplicates
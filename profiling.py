@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Ghibli Landscapes API - Request Profiling
+
+This module implements an opt-in request profiler for the Flask app. When
+enabled it logs a timing breakdown for slow requests and profiles a sampled
+fraction of requests, writing per-route cProfile stats and flame-graph
+compatible folded stacks to disk. It can be toggled at runtime; when disabled
+no timing or profiling is done, and the request hooks that stay installed
+return after a single environ lookup.
+"""
+
+import os
+import sys
+import math
+import time
+import marshal
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter, defaultdict
+from flask import g, request, template_rendered, before_render_template
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_SLOW_MS = 500.0
+DEFAULT_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+DUMP_EVERY = 20                  # Sampled requests per route between dumps
+
+ENVIRON_KEY = "profiling.timings"
+
+
+def _check_number(name, value, low, high=math.inf):
+    """Validate that a setting is a finite real number within [low, high]."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    if value < low:
+        raise ValueError(f"{name} must be at least {low:g}")
+    if value > high:
+        raise ValueError(f"{name} must be at most {high:g}")
+    return float(value)
+
+
+def _env_number(name, default, low, high=math.inf):
+    """Read a numeric setting from the environment, falling back to the default if invalid."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return _check_number(name, float(value), low, high)
+    except ValueError as e:
+        logger.warning(f"Ignoring {name}={value!r} ({e}); using default {default}")
+        return default
+
+
+def _env_flag(name, default=False):
+    """Read a boolean flag from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# -----------------------------------------------------------------------------
+# Stack sampling
+# -----------------------------------------------------------------------------
+class _StackSampler:
+    """Background thread that samples the stacks of profiled request threads."""
+
+    def __init__(self, interval, on_tick=None):
+        self.interval = interval
+        self.on_tick = on_tick
+        self.stacks = defaultdict(Counter)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def track(self, thread_id, endpoint):
+        with self._lock:
+            self._active[thread_id] = endpoint
+
+    def untrack(self, thread_id):
+        with self._lock:
+            self._active.pop(thread_id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+            if self.on_tick is not None:
+                self.on_tick()
+
+    def _sample(self):
+        with self._lock:
+            if not self._active:
+                return
+            active = dict(self._active)
+        frames = sys._current_frames()
+        for thread_id, endpoint in active.items():
+            frame = frames.get(thread_id)
+            if frame is not None:
+                stack = self._fold(frame)
+                with self._lock:
+                    self.stacks[endpoint][stack] += 1
+
+    @staticmethod
+    def _fold(frame):
+        """Return a frame's stack in folded format, outermost call first."""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+# -----------------------------------------------------------------------------
+# JSON serialization timing
+# -----------------------------------------------------------------------------
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records time spent building JSON responses."""
+
+    def response(self, *args, **kwargs):
+        timings = request.environ.get(ENVIRON_KEY) if request else None
+        if timings is None:
+            return super().response(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            timings["serialize"] += time.perf_counter() - start
+
+
+# -----------------------------------------------------------------------------
+# Profiler
+# -----------------------------------------------------------------------------
+class RequestProfiler:
+    """
+    Opt-in request profiler.
+
+    Timing breakdown phases:
+      - routing: WSGI entry until the first before_request hook (URL matching)
+      - lookup: view function time excluding serialization and rendering
+      - serialize: JSON response building
+      - render: template loading, compilation and rendering
+      - total: WSGI entry until the response is returned
+    """
+
+    def __init__(self, app=None, output_dir=DEFAULT_OUTPUT_DIR, sample_rate=DEFAULT_SAMPLE_RATE,
+                 slow_ms=DEFAULT_SLOW_MS, enabled=False):
+        self.output_dir = output_dir
+        self.sample_rate = _check_number("sample_rate", sample_rate, 0.0, 1.0)
+        self.slow_ms = _check_number("slow_ms", slow_ms, 0.0)
+        self.enabled = False
+        self._stats = {}
+        self._samples = Counter()
+        self._lock = threading.Lock()
+        self._dump_requested = threading.Event()
+        # Periodic dumps run on the sampler thread, off the request path
+        self._sampler = _StackSampler(DEFAULT_SAMPLE_INTERVAL, on_tick=self._dump_if_requested)
+        self._app = None
+        if app is not None:
+            self.init_app(app)
+        if enabled:
+            self.enable()
+
+    @classmethod
+    def from_env(cls, app=None):
+        """
+        Create a profiler configured from PROFILING_* environment variables.
+
+        Invalid numeric values are logged and replaced by their defaults.
+        """
+        return cls(
+            app,
+            output_dir=os.environ.get("PROFILING_DIR", DEFAULT_OUTPUT_DIR),
+            sample_rate=_env_number("PROFILING_SAMPLE_RATE", DEFAULT_SAMPLE_RATE, 0.0, 1.0),
+            slow_ms=_env_number("PROFILING_SLOW_MS", DEFAULT_SLOW_MS, 0.0),
+            enabled=_env_flag("PROFILING_ENABLED"),
+        )
+
+    def init_app(self, app):
+        """Install the profiling hooks on a Flask app."""
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        self._app = app
+
+        wsgi_app = app.wsgi_app
+
+        def profiled_wsgi_app(environ, start_response):
+            if not self.enabled:
+                return wsgi_app(environ, start_response)
+            environ[ENVIRON_KEY] = {"start": time.perf_counter(), "serialize": 0.0, "render": 0.0}
+            try:
+                return wsgi_app(environ, start_response)
+            finally:
+                self._finish(environ)
+
+        app.wsgi_app = profiled_wsgi_app
+
+    # -------------------------------------------------------------------------
+    # Runtime control
+    # -------------------------------------------------------------------------
+    def enable(self):
+        """Start profiling requests."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._sampler.start()
+        if self._app is not None:
+            # Template timing is only installed while profiling is on
+            self._app.jinja_env.get_or_select_template = self._timed_get_template
+            before_render_template.connect(self._before_render, self._app)
+            template_rendered.connect(self._after_render, self._app)
+        self.enabled = True
+        logger.info(f"Profiling enabled (sample rate {self.sample_rate}, slow threshold {self.slow_ms} ms)")
+
+    def disable(self):
+        """Stop profiling requests and write any pending profiles to disk."""
+        self.enabled = False
+        if self._app is not None:
+            self._app.jinja_env.__dict__.pop("get_or_select_template", None)
+            before_render_template.disconnect(self._before_render)
+            template_rendered.disconnect(self._after_render)
+        self._sampler.stop()
+        self.dump()
+        logger.info("Profiling disabled")
+
+    def configure(self, enabled=None, sample_rate=None, slow_ms=None):
+        """
+        Update settings at runtime.
+
+        All values are validated before any of them is applied, so an invalid
+        setting raises ValueError and leaves the profiler unchanged.
+        """
+        if enabled is not None and not isinstance(enabled, bool):
+            raise ValueError("enabled must be a boolean")
+        if sample_rate is not None:
+            sample_rate = _check_number("sample_rate", sample_rate, 0.0, 1.0)
+        if slow_ms is not None:
+            slow_ms = _check_number("slow_ms", slow_ms, 0.0)
+
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if enabled is True and not self.enabled:
+            self.enable()
+        elif enabled is False and self.enabled:
+            self.disable()
+
+    def status(self):
+        """Return the current settings and per-route sample counts."""
+        with self._lock:
+            samples = dict(self._samples)
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "output_dir": self.output_dir,
+            "samples": samples,
+        }
+
+    def dump(self):
+        """Write aggregated per-route profiles and folded stacks to disk."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Snapshot under the lock, write to disk after releasing it
+        with self._lock:
+            stats = {endpoint: marshal.dumps(route_stats.stats)
+                     for endpoint, route_stats in self._stats.items()}
+        for endpoint, data in stats.items():
+            with open(os.path.join(self.output_dir, f"{endpoint}.prof"), "wb") as f:
+                f.write(data)
+        with self._sampler._lock:
+            stacks = {endpoint: dict(counts) for endpoint, counts in self._sampler.stacks.items()}
+        for endpoint, counts in stacks.items():
+            with open(os.path.join(self.output_dir, f"{endpoint}.folded"), "w", encoding="utf-8") as f:
+                for stack, count in counts.items():
+                    f.write(f"{stack} {count}\n")
+
+    # -------------------------------------------------------------------------
+    # Request hooks
+    # -------------------------------------------------------------------------
+    def _before_request(self):
+        timings = request.environ.get(ENVIRON_KEY)
+        if timings is None:
+            return
+        timings["routed"] = time.perf_counter()
+        if random.random() >= self.sample_rate:
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            return
+        g._profile = profile
+        self._sampler.track(threading.get_ident(), request.endpoint or "unmatched")
+
+    def _teardown_request(self, exc):
+        timings = request.environ.get(ENVIRON_KEY)
+        if timings is None:
+            return
+        timings["handled"] = time.perf_counter()
+        timings["endpoint"] = request.endpoint or "unmatched"
+
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return
+        profile.disable()
+        self._sampler.untrack(threading.get_ident())
+        self._record(timings["endpoint"], profile)
+
+    def _timed_get_template(self, *args, **kwargs):
+        env = self._app.jinja_env
+        get_template = type(env).get_or_select_template
+        timings = request.environ.get(ENVIRON_KEY) if request else None
+        if timings is None:
+            return get_template(env, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return get_template(env, *args, **kwargs)
+        finally:
+            timings["render"] += time.perf_counter() - start
+
+    def _before_render(self, sender, template, context, **extra):
+        timings = request.environ.get(ENVIRON_KEY) if request else None
+        if timings is not None:
+            timings["render_start"] = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        timings = request.environ.get(ENVIRON_KEY) if request else None
+        if timings is not None and "render_start" in timings:
+            timings["render"] += time.perf_counter() - timings.pop("render_start")
+
+    def _record(self, endpoint, profile):
+        with self._lock:
+            if endpoint in self._stats:
+                self._stats[endpoint].add(profile)
+            else:
+                self._stats[endpoint] = pstats.Stats(profile)
+            self._samples[endpoint] += 1
+            if self._samples[endpoint] % DUMP_EVERY == 0:
+                self._dump_requested.set()
+
+    def _dump_if_requested(self):
+        if self._dump_requested.is_set():
+            self._dump_requested.clear()
+            try:
+                self.dump()
+            except OSError as e:
+                logger.error(f"Error writing profiles to {self.output_dir}: {e}")
+
+    def _finish(self, environ):
+        timings = environ.pop(ENVIRON_KEY)
+        end = time.perf_counter()
+        total_ms = (end - timings["start"]) * 1000
+        if total_ms < self.slow_ms:
+            return
+
+        routed = timings.get("routed", end)
+        handled = timings.get("handled", end)
+        serialize_ms = timings["serialize"] * 1000
+        render_ms = timings["render"] * 1000
+        breakdown = {
+            "routing": (routed - timings["start"]) * 1000,
+            "lookup": max((handled - routed) * 1000 - serialize_ms - render_ms, 0.0),
+            "serialize": serialize_ms,
+            "render": render_ms,
+            "total": total_ms,
+        }
+        logger.warning(
+            f"Slow request {environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')} "
+            f"({timings.get('endpoint', 'unmatched')}): "
+            + ", ".join(f"{phase}={ms:.1f}ms" for phase, ms in breakdown.items())
+        )
@@ -16,8 +16,12 @@ import time
 import random
 from urllib.parse import urljoin
 
+from phash import compute_dhash, find_duplicates
+
 # Constants
 BASE_URL = "https://www.ghibli.jp/works/"
+DOWNLOAD_TIMEOUT = 30  # Seconds
+DOWNLOAD_DELAY = 0.2   # Seconds between image downloads
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
 DATABASE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.json")
 
@@ -113,6 +117,42 @@ def generate_image_id(image_url):
     """Generate a consistent ID for an image URL using SHA-256."""
     return hashlib.sha256(image_url.encode()).hexdigest()[:16]
 
+# Function to get the local path of an image, downloading it if needed
+def get_local_image(image_url):
+    """Return the local path of an image, downloading it if not stored yet."""
+    local_path = os.path.join(OUTPUT_DIR, os.path.basename(image_url))
+    if os.path.exists(local_path):
+        return local_path
+
+    try:
+        response = requests.get(image_url, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        with open(local_path, 'wb') as f:
+            f.write(response.content)
+        return local_path
+    except Exception as e:
+        print(f"Error downloading {image_url}: {e}")
+        return None
+    finally:
+        # Be nice to the server
+        time.sleep(DOWNLOAD_DELAY)
+
+# Function to hash images and drop near-duplicate frames
+def deduplicate_images(images):
+    """Add perceptual hashes to image records and remove near-duplicates."""
+    for image in images:
+        local_path = get_local_image(image["url"])
+        if not local_path:
+            continue
+        try:
+            image["phash"] = compute_dhash(local_path)
+        except Exception as e:
+            print(f"Error hashing {local_path}: {e}")
+
+    duplicates = find_duplicates(images)
+    print(f"Removed {len(duplicates)} near-duplicate images")
+    return [image for image in images if image["id"] not in duplicates]
+
 # Main function to collect all images
 def collect_all_images():
     """Collect all landscape images from all films and create a database."""
@@ -148,6 +188,9 @@ def collect_all_images():
         # Be nice to the server
         time.sleep(1)
     
+    # Hash the stored images and drop near-identical consecutive frames
+    database["images"] = deduplicate_images(database["images"])
+    
     # Save the database to a JSON file
     with open(DATABASE_FILE, 'w', encoding='utf-8') as f:
         json.dump(database, f, ensure_ascii=False, indent=2)
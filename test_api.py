@@ -5,13 +5,18 @@ Ghibli Landscapes API - Test Script
 This script tests the API for consistency and randomness.
 """
 
+import os
 import requests
 import json
 import time
 import sys
 
+from bench_phash import make_catalog
+from phash import SimilarityIndex, find_duplicates, hamming_distance
+
 # Constants
 API_BASE_URL = "http://localhost:5000"
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")  # Must match the server's token
 TEST_QUERIES = [
     "totoro",
     "spirited away",
@@ -154,6 +159,110 @@ def test_film_endpoint():
     except Exception as e:
         print(f"Error testing film endpoint: {e}")
 
+def test_similarity_index():
+    """Test similarity ranking and deduplication on a synthetic catalog (no server needed)."""
+    print("\n=== Testing Similarity Index ===")
+    
+    images = make_catalog(5000)
+    query = images[0]
+    query_hash = int(query["phash"], 16)
+    
+    # Plant neighbours at Hamming distances 3, 1 and 2 from the query, each in
+    # its own film so they are not near-duplicates of each other
+    planted = []
+    for i, flipped_bits in enumerate([0b111 << 20, 0b1, 0b11 << 40]):
+        planted.append({"id": f"planted{i}", "film_code": f"film{i + 1}", "phash": f"{query_hash ^ flipped_bits:016x}"})
+    images += planted
+    
+    index = SimilarityIndex.from_images(images)
+    similar = index.similar_to(query["id"], 10)
+    expected = sorted(hamming_distance(query["phash"], img["phash"]) for img in images[1:])[:10]
+    
+    passed = True
+    if [image_id for image_id, _ in similar[:3]] != ["planted1", "planted2", "planted0"]:
+        print(f"❌ Planted neighbours not ranked first: {similar[:3]}")
+        passed = False
+    if [distance for _, distance in similar] != expected:
+        print(f"❌ Distances {[d for _, d in similar]} do not match brute-force scan {expected}")
+        passed = False
+    if query["id"] in [image_id for image_id, _ in similar]:
+        print("❌ Query image returned as its own neighbour")
+        passed = False
+    
+    # Plant a near-duplicate pair within one film and one spanning two films
+    base_hash = int(images[1]["phash"], 16) ^ (1 << 63)
+    images += [
+        {"id": "same-film-first", "film_code": "film4", "phash": f"{base_hash:016x}"},
+        {"id": "same-film-second", "film_code": "film4", "phash": f"{base_hash ^ 1:016x}"},
+        {"id": "cross-film-first", "film_code": "film5", "phash": f"{base_hash ^ (0xff << 8):016x}"},
+        {"id": "cross-film-second", "film_code": "film6", "phash": f"{base_hash ^ (0xff << 8) ^ 1:016x}"},
+    ]
+    duplicates = find_duplicates(images)
+    if duplicates != {"same-film-second"}:
+        print(f"❌ Expected only 'same-film-second' to be a duplicate, got {sorted(duplicates)}")
+        passed = False
+    
+    if passed:
+        print("✅ Similarity index ranks neighbours and drops same-film duplicates")
+    return passed
+
+def test_similar_endpoint():
+    """Test the similar images endpoint."""
+    print("\n=== Testing Similar Endpoint ===")
+    
+    try:
+        response = requests.get(f"{API_BASE_URL}/api/random")
+        response.raise_for_status()
+        image_id = response.json().get("id")
+        
+        response = requests.get(f"{API_BASE_URL}/api/image/{image_id}/similar", params={"k": 3})
+        if response.status_code == 404:
+            print(f"Image {image_id} has no perceptual hash, skipping")
+            return
+        response.raise_for_status()
+        similar = response.json().get("similar", [])
+        
+        distances = [img.get("distance") for img in similar]
+        print(f"Image {image_id}: Got {len(similar)} similar images with distances {distances}")
+        
+        if len(similar) <= 3 and distances == sorted(distances) and image_id not in [img.get("id") for img in similar]:
+            print("✅ Similar endpoint returns ranked neighbours")
+        else:
+            print("❌ Similar endpoint returned unexpected results")
+        
+    except Exception as e:
+        print(f"Error testing similar endpoint: {e}")
+
+def test_profiling_endpoint():
+    """Test toggling profiling at runtime."""
+    print("\n=== Testing Profiling Endpoint ===")
+    
+    if not PROFILING_TOKEN:
+        print("PROFILING_TOKEN not set, skipping")
+        return
+    
+    url = f"{API_BASE_URL}/api/admin/profiling"
+    headers = {"X-Profiling-Token": PROFILING_TOKEN}
+    
+    try:
+        original = requests.get(url, headers=headers).json()
+        
+        response = requests.post(url, headers=headers, json={"enabled": True, "sample_rate": 0.5, "slow_ms": 250})
+        response.raise_for_status()
+        status = requests.get(url, headers=headers).json()
+        print(f"Profiling status after enabling: {status}")
+        
+        if status.get("enabled") is True and status.get("sample_rate") == 0.5 and status.get("slow_ms") == 250:
+            print("✅ Profiling settings applied")
+        else:
+            print("❌ Profiling settings were not applied")
+        
+        # Restore the previous settings
+        requests.post(url, headers=headers, json={key: original[key] for key in ("enabled", "sample_rate", "slow_ms")})
+        
+    except Exception as e:
+        print(f"Error testing profiling endpoint: {e}")
+
 def test_error_handling():
     """Test error handling."""
     print("\n=== Testing Error Handling ===")
@@ -161,12 +270,25 @@ def test_error_handling():
     test_cases = [
         {"endpoint": "/api/image", "params": {}, "expected_status": 400, "description": "Missing required parameters"},
         {"endpoint": "/api/image", "params": {"id": "nonexistent"}, "expected_status": 404, "description": "Nonexistent ID"},
-        {"endpoint": "/api/film/nonexistent", "params": {}, "expected_status": 404, "description": "Nonexistent film code"}
+        {"endpoint": "/api/film/nonexistent", "params": {}, "expected_status": 404, "description": "Nonexistent film code"},
+        {"endpoint": "/api/image/nonexistent/similar", "params": {}, "expected_status": 404, "description": "Similar images for nonexistent ID"},
+        {"endpoint": "/api/image/nonexistent/similar", "params": {"k": "abc"}, "expected_status": 400, "description": "Non-integer similar count"}
     ]
     
+    if PROFILING_TOKEN:
+        test_cases += [
+            {"endpoint": "/api/admin/profiling", "params": {}, "headers": {"X-Profiling-Token": "wrong"}, "expected_status": 403, "description": "Bad profiling token"},
+            {"endpoint": "/api/admin/profiling", "method": "POST", "params": {}, "headers": {"X-Profiling-Token": PROFILING_TOKEN}, "json": [1], "expected_status": 400, "description": "Non-object profiling body"},
+            {"endpoint": "/api/admin/profiling", "method": "POST", "params": {}, "headers": {"X-Profiling-Token": PROFILING_TOKEN}, "json": {"sample_rate": True}, "expected_status": 400, "description": "Non-numeric sample rate"},
+            {"endpoint": "/api/admin/profiling", "method": "POST", "params": {}, "headers": {"X-Profiling-Token": PROFILING_TOKEN}, "json": {"enabled": "false"}, "expected_status": 400, "description": "Non-boolean enabled flag"}
+        ]
+    else:
+        test_cases.append({"endpoint": "/api/admin/profiling", "params": {}, "expected_status": 404, "description": "Profiling endpoint without configured token"})
+    
     for test_case in test_cases:
         try:
-            response = requests.get(f"{API_BASE_URL}{test_case['endpoint']}", params=test_case['params'])
+            response = requests.request(test_case.get("method", "GET"), f"{API_BASE_URL}{test_case['endpoint']}",
+                                        params=test_case['params'], headers=test_case.get("headers"), json=test_case.get("json"))
             
             if response.status_code == test_case["expected_status"]:
                 print(f"✅ {test_case['description']}: Got expected status {response.status_code}")
@@ -180,6 +302,10 @@ def main():
     """Run all tests."""
     print("Starting Ghibli Landscapes API tests...")
     
+    # Offline checks that do not need the API
+    if not test_similarity_index():
+        sys.exit(1)
+    
     # Check if API is running
     try:
         response = requests.get(f"{API_BASE_URL}/")
@@ -190,6 +316,8 @@ def main():
         test_random_endpoint()
         test_consistency()
         test_film_endpoint()
+        test_similar_endpoint()
+        test_profiling_endpoint()
         test_error_handling()
         
         print("\n=== Test Summary ===")